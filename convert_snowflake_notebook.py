@@ -13,83 +13,120 @@
 # limitations under the License.
 
 import json
+import mmap
+import re
 import argparse
-import uuid
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def convert_notebook(input_filename, output_filename):
+
+# Digit runs that may not fit in 64 bits, which orjson would read as floats
+_LONG_DIGITS_RE = re.compile(rb"\d{19,}")
+
+# Cells prepended to every converted notebook
+_HEADER_CELLS_TEMPLATE = (
+    {
+        "cell_type": "markdown",
+        "id": "sfhdr-0",
+        "source": "# Prepare python environment\nCreate a python virtual environment and install `ipykernel` package before running the notebook",
+    },
+    {
+        "cell_type": "code",
+        "id": "sfhdr-1",
+        "metadata": {"language": "python"},
+        "source": "%%capture pip_install_output\n%pip install streamlit ipython",
+    },
+    {
+        "cell_type": "markdown",
+        "id": "sfhdr-2",
+        "source": "Install snowflake sql magics extension and configure it to connect to your Snowflake account",
+    },
+    {
+        "cell_type": "code",
+        "id": "sfhdr-3",
+        "metadata": {"language": "python"},
+        "source": "\n".join(
+            [
+                "%reload_ext snowflake_sql_magics",
+                "SNOWFLAKE_ACCOUNT = '<YOUR SNOWFLAKE ACCOUNT NAME>'",
+                "SNOWFLAKE_USER = '<YOUR SNOWFLAKE USER NAME>'",
+                "SNOWFLAKE_ROLE = '<SNOWFLAKE ROLE YOU WANT TO USE>'",
+                "SNOWFLAKE_PRIVATE_KEY_PATH = '<PATH TO YOUR PRIVATE KEY FILE FOR KEY-PAIR AUTHENTICATION>'",
+                "%snowauth --account $SNOWFLAKE_ACCOUNT --user $SNOWFLAKE_USER --role $SNOWFLAKE_ROLE --private_key_path $SNOWFLAKE_PRIVATE_KEY_PATH",
+            ]
+        ),
+    },
+    {
+        "cell_type": "markdown",
+        "id": "sfhdr-4",
+        "source": "## Test the connection",
+    },
+    {
+        "cell_type": "code",
+        "id": "sfhdr-5",
+        "metadata": {"language": "python"},
+        "source": "\n".join(
+            [
+                "%%snowsql test_connection",
+                "SELECT CURRENT_USER(), CURRENT_ROLE(), CURRENT_VERSION();",
+            ]
+        ),
+    },
+)
+
+
+def _dumps(obj):
     """
-    Reads a Jupyter notebook, converts SQL cells to Python cells with snowsql magic,
-    and writes to a new notebook file.
+    Serializes obj to indented JSON bytes.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+        except orjson.JSONEncodeError:
+            # Integers wider than 64 bits are only supported by json
+            pass
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
+def _loads(data):
+    """
+    Parses JSON bytes with orjson, or with json if they may contain integers
+    wider than 64 bits so that those are not turned into floats.
+    """
+    if _LONG_DIGITS_RE.search(data):
+        return json.loads(bytes(data))
+    return orjson.loads(data)
+
+
+def _load_json_file(f):
+    """
+    Parses the binary file f, straight from a memory map of the file
+    instead of a copy of it when the file can be mapped.
     """
     try:
-        with open(input_filename, "r", encoding="utf-8") as f:
-            notebook = json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Input file not found at {input_filename}")
-        return
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from {input_filename}")
-        return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Pipes and other non-regular files cannot be mapped, nor can empty files
+        return _loads(f.read())
+    with mm, memoryview(mm) as view:
+        return _loads(view)
 
-    # Create new cells to be added
-    new_cells_at_beginning = [
-        {
-            "cell_type": "markdown",
-            "id": str(uuid.uuid4()),
-            "source": "# Prepare python environment\nCreate a python virtual environment and install `ipykernel` package before running the notebook",
-        },
-        {
-            "cell_type": "code",
-            "id": str(uuid.uuid4()),
-            "metadata": {"language": "python"},
-            "source": "%%capture pip_install_output\n%pip install streamlit ipython",
-        },
-        {
-            "cell_type": "markdown",
-            "id": str(uuid.uuid4()),
-            "source": "Install snowflake sql magics extension and configure it to connect to your Snowflake account",
-        },
-        {
-            "cell_type": "code",
-            "id": str(uuid.uuid4()),
-            "metadata": {"language": "python"},
-            "source": "\n".join(
-                [
-                    "%reload_ext snowflake_sql_magics",
-                    "SNOWFLAKE_ACCOUNT = '<YOUR SNOWFLAKE ACCOUNT NAME>'",
-                    "SNOWFLAKE_USER = '<YOUR SNOWFLAKE USER NAME>'",
-                    "SNOWFLAKE_ROLE = '<SNOWFLAKE ROLE YOU WANT TO USE>'",
-                    "SNOWFLAKE_PRIVATE_KEY_PATH = '<PATH TO YOUR PRIVATE KEY FILE FOR KEY-PAIR AUTHENTICATION>'",
-                    "%snowauth --account $SNOWFLAKE_ACCOUNT --user $SNOWFLAKE_USER --role $SNOWFLAKE_ROLE --private_key_path $SNOWFLAKE_PRIVATE_KEY_PATH",
-                ]
-            ),
-        },
-        {
-            "cell_type": "markdown",
-            "id": str(uuid.uuid4()),
-            "source": "## Test the connection",
-        },
-        {
-            "cell_type": "code",
-            "id": str(uuid.uuid4()),
-            "metadata": {"language": "python"},
-            "source": "\n".join(
-                [
-                    "%%snowsql test_connection",
-                    "SELECT CURRENT_USER(), CURRENT_ROLE(), CURRENT_VERSION();",
-                ]
-            ),
-        },
-    ]
-
-    # Prepend new cells
-    notebook["cells"] = new_cells_at_beginning + notebook.setdefault("cells", [])
-
-    for cell in notebook.get("cells", []):
+
+def stream_cells(new_cells_at_beginning, cells):
+    """
+    Yields the new cells followed by the notebook cells, converting SQL cells
+    to Python cells with snowsql magic along the way.
+    """
+    # The new cells are never SQL cells, only the notebook cells are converted
+    yield from new_cells_at_beginning
+
+    for cell in cells:
         if cell.get("cell_type") == "code":
-            metadata = cell.get("metadata", {})
-            if metadata.get("language") == "sql":
+            metadata = cell.get("metadata")
+            if metadata and metadata.get("language") == "sql":
                 # Change language to python
                 metadata["language"] = "python"
 
@@ -98,13 +135,67 @@ def convert_notebook(input_filename, output_filename):
                 if isinstance(source, str):
                     source = "%%snowsql\n" + source
                 elif isinstance(source, list):
-                    source.insert(0, "%%snowsql\n")
+                    # Prefix the first line instead of shifting the whole list
+                    if source:
+                        source[0] = "%%snowsql\n" + source[0]
+                    else:
+                        source = ["%%snowsql\n"]
 
                 cell["source"] = source
+        yield cell
+
+
+def write_cells(output_filename, notebook, cells):
+    """
+    Writes the notebook to output_filename, serializing the cells one at a time
+    in place of notebook["cells"] instead of building the whole document in memory.
+    """
+    with open(output_filename, "wb") as f:
+        f.write(b"{")
+        separator = b"\n  "
+        for key, value in notebook.items():
+            f.write(separator + _dumps(key) + b": ")
+            separator = b",\n  "
+            if key != "cells":
+                f.write(_dumps(value).replace(b"\n", b"\n  "))
+                continue
+
+            f.write(b"[")
+            cell_separator = b"\n    "
+            for cell in cells:
+                f.write(cell_separator + _dumps(cell).replace(b"\n", b"\n    "))
+                cell_separator = b",\n    "
+            f.write(b"]" if cell_separator == b"\n    " else b"\n  ]")
+        f.write(b"\n}")
+
+
+def convert_notebook(input_filename, output_filename):
+    """
+    Reads a Jupyter notebook, converts SQL cells to Python cells with snowsql magic,
+    and writes to a new notebook file.
+    """
+    try:
+        if orjson is not None:
+            with open(input_filename, "rb") as f:
+                notebook = _load_json_file(f)
+        else:
+            with open(input_filename, "r", encoding="utf-8") as f:
+                notebook = json.load(f)
+    except FileNotFoundError:
+        print(f"Error: Input file not found at {input_filename}")
+        return
+    except json.JSONDecodeError:
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        print(f"Error: Could not decode JSON from {input_filename}")
+        return
+
+    # Create new cells to be added
+    new_cells_at_beginning = [dict(cell) for cell in _HEADER_CELLS_TEMPLATE]
+
+    cells = stream_cells(new_cells_at_beginning, notebook.setdefault("cells", []))
 
     try:
-        with open(output_filename, "w", encoding="utf-8") as f:
-            json.dump(notebook, f, indent=2)
+        write_cells(output_filename, notebook, cells)
         print(f"Successfully converted {input_filename} to {output_filename}")
     except IOError as e:
         print(f"Error writing to output file {output_filename}: {e}")
@@ -18,12 +18,213 @@ import argparse
 import traceback
 import re
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 import pandas as pd
+import pyarrow as pa
 import snowflake.connector
+from cryptography.hazmat.primitives import serialization
 from IPython.core.magic import Magics, magics_class, cell_magic, line_magic
 from IPython.display import display
 
+# Regex to find FILE('path') or FILE("path")
+_FILE_DIRECTIVE_RE = re.compile(r"FILE\((['\"])(.*?)\1\)")
+
+# Argument parsers for the magic lines, built once. Errors are raised instead
+# of exiting, since the magics run inside the kernel.
+_SNOWAUTH_PARSER = ArgumentParser(
+    prog="%snowauth",
+    description="Snowflake authentication line magic",
+    add_help=False,
+    exit_on_error=False,
+)
+_SNOWAUTH_PARSER.add_argument("--account", help="Snowflake account")
+_SNOWAUTH_PARSER.add_argument("--user", help="Snowflake user")
+_SNOWAUTH_PARSER.add_argument("--role", help="Snowflake role")
+_SNOWAUTH_PARSER.add_argument("--private_key_path", help="Path to private key file")
+_SNOWAUTH_PARSER.add_argument(
+    "--private_key_passphrase", help="Passphrase for private key"
+)
+
+
+def _non_negative_int(value: str) -> int:
+    """
+    argparse type for row counts, which cannot be negative.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {value}")
+    return number
+
+
+_SNOWSQL_PARSER = ArgumentParser(
+    prog="%%snowsql",
+    description="Snowflake SQL cell magic",
+    add_help=False,
+    exit_on_error=False,
+)
+_SNOWSQL_PARSER.add_argument(
+    "var_name", nargs="?", help="Variable to store the result in"
+)
+_SNOWSQL_PARSER.add_argument(
+    "--limit-preview",
+    type=_non_negative_int,
+    help="Maximum number of rows to display",
+)
+
+# Messages reported for DML statements, keyed on the statement type
+_DML_MESSAGES = {
+    "INSERT": "Number of rows inserted",
+    "UPDATE": "Number of rows updated",
+    "DELETE": "Number of rows deleted",
+    "MERGE": "Number of rows affected",
+}
+
+# File transfer statement types
+_FILE_TRANSFER_STATEMENTS = frozenset({"PUT", "GET"})
+
+# Error raised when Snowflake counts a different number of statements
+_STATEMENT_COUNT_MISMATCH_ERRNO = 8
+
+
+@lru_cache(maxsize=64)
+def _read_file_cached(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Reads the file referenced by a FILE() directive. The modification time and
+    size are part of the cache key, so a file is read again once it changes.
+    """
+    with open(path, "r") as f:
+        return f.read()
+
+
+def _file_directive_sql(file_path: str) -> str:
+    """
+    Returns the SQL that replaces a FILE() directive for the given path.
+    """
+    try:
+        st = os.stat(file_path)
+        content = _read_file_cached(file_path, st.st_mtime_ns, st.st_size)
+        # Use Snowflake's dollar-quoted string constants to handle special characters
+        if "$$" not in content:
+            return f"PARSE_JSON($${content}$$)"
+        # Dollar-quoted constants cannot contain $$, fall back to an escaped string
+        escaped = content.replace("\\", "\\\\").replace("'", "\\'")
+        return f"PARSE_JSON('{escaped}')"
+    except FileNotFoundError:
+        return f"/* FILE NOT FOUND: {file_path} */"
+    except Exception as e:
+        return f"/* ERROR READING FILE {file_path}: {e} */"
+
+
+def _split_sql_statements(sql: str) -> list:
+    """
+    Splits a SQL script on semicolons that are not inside single-quoted strings,
+    double-quoted identifiers, $$ blocks or comments, in a single pass.
+    """
+    statements = []
+    start = 0
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == ";":
+            statements.append(sql[start:i])
+            start = i + 1
+        elif ch == "'":
+            # Backslash escapes the next character; '' is handled as two strings.
+            i += 1
+            while i < n and sql[i] != "'":
+                i += 2 if sql[i] == "\\" else 1
+        elif ch == '"':
+            i = sql.find('"', i + 1)
+        elif sql.startswith("$$", i):
+            i = sql.find("$$", i + 2)
+            if i != -1:
+                i += 1
+        elif sql.startswith("--", i):
+            i = sql.find("\n", i + 2)
+        elif sql.startswith("/*", i):
+            i = sql.find("*/", i + 2)
+            if i != -1:
+                i += 1
+        if i == -1:
+            break
+        i += 1
+    statements.append(sql[start:])
+    return statements
+
+
+def _skip_comments(sql: str) -> int:
+    """
+    Returns the index of the first character of a SQL statement that is not
+    whitespace or part of a comment, or len(sql) if there is none.
+    """
+    i = 0
+    n = len(sql)
+    while i < n:
+        if sql[i].isspace():
+            i += 1
+        elif sql.startswith("--", i):
+            i = sql.find("\n", i + 2)
+            if i == -1:
+                return n
+        elif sql.startswith("/*", i):
+            i = sql.find("*/", i + 2)
+            if i == -1:
+                return n
+            i += 2
+        else:
+            break
+    return i
+
+
+def _first_keyword(sql: str) -> str:
+    """
+    Returns the first keyword of a SQL statement in upper case, skipping
+    leading whitespace and comments, without splitting the statement.
+    """
+    i = _skip_comments(sql)
+    j = i
+    n = len(sql)
+    while j < n and sql[j].isalpha():
+        j += 1
+    return sql[i:j].upper()
+
+
+class LazyResult:
+    """
+    Query result kept as a pyarrow Table until it is displayed or assigned,
+    at which point it is converted to a pandas DataFrame once and cached.
+    """
+
+    def __init__(self, table):
+        self._table = table
+        self._df = None
+
+    def to_pandas(self) -> pd.DataFrame:
+        if self._df is None:
+            self._df = self._table.to_pandas(types_mapper=pd.ArrowDtype)
+        return self._df
+
+    def head(self, n: int) -> pd.DataFrame:
+        """
+        Returns the first n rows, converting only those rows if the full
+        DataFrame has not been built yet.
+        """
+        if self._df is not None:
+            return self._df.head(n)
+        return self._table.slice(0, n).to_pandas(types_mapper=pd.ArrowDtype)
+
+    def __repr__(self):
+        return repr(self.to_pandas())
+
+    def _repr_html_(self):
+        return self.to_pandas()._repr_html_()
+
 
 @magics_class
 class SnowflakeSqlMagics(Magics):
@@ -36,55 +237,164 @@ class SnowflakeSqlMagics(Magics):
         self.role = None
         self.private_key_path = None
         self.private_key_passphrase = None
+        self._private_key = None
 
     def _process_file_directives(self, sql_query: str) -> str:
         """
         Processes file directives like FILE('path/to/file') in the SQL query.
         """
+        file_paths = list(
+            {m.group(2).strip() for m in _FILE_DIRECTIVE_RE.finditer(sql_query)}
+        )
+        if not file_paths:
+            return sql_query
+
+        # Read the files in parallel, each distinct path only once
+        if len(file_paths) == 1:
+            replacements = {path: _file_directive_sql(path) for path in file_paths}
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(file_paths), 8)) as pool:
+                replacements = dict(
+                    zip(file_paths, pool.map(_file_directive_sql, file_paths))
+                )
 
-        def replace_directive(match):
-            file_path = match.group(2).strip()
-            try:
-                with open(file_path, "r") as f:
-                    content = f.read()
-                # Use Snowflake's dollar-quoted string constants to handle special characters
-                return f"PARSE_JSON($${content}$$)"
-            except FileNotFoundError:
-                return f"/* FILE NOT FOUND: {file_path} */"
-            except Exception as e:
-                return f"/* ERROR READING FILE {file_path}: {e} */"
-
-        # Regex to find FILE('path') or FILE("path")
-        pattern = re.compile(r"FILE\((['\"])(.*?)\1\)")
-        return pattern.sub(replace_directive, sql_query)
+        return _FILE_DIRECTIVE_RE.sub(
+            lambda match: replacements[match.group(2).strip()], sql_query
+        )
+
+    def _load_private_key(self) -> bytes:
+        """
+        Reads the PEM private key file and returns the key as DER-encoded bytes.
+        """
+        with open(self.private_key_path, "rb") as f:
+            private_key = serialization.load_pem_private_key(
+                f.read(),
+                password=(
+                    self.private_key_passphrase.encode()
+                    if self.private_key_passphrase
+                    else None
+                ),
+            )
+        return private_key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
 
     def _create_connection(self):
         """
         Creates a connection to Snowflake using the snowflake-connector-python library
 
         Checks if a connection already exists and is closed. If so, it creates a new connection.
+        The session is kept alive with a heartbeat so that it does not time out while the
+        notebook is idle, and the private key is read only once.
         """
         if not self.conn or self.conn.is_closed():
+            if self._private_key is None:
+                self._private_key = self._load_private_key()
             self.conn = snowflake.connector.connect(
                 account=self.account,
                 authenticator="SNOWFLAKE_JWT",
                 user=self.user,
                 role=self.role,
-                private_key_file=self.private_key_path,
-                private_key_file_pwd=self.private_key_passphrase,
+                private_key=self._private_key,
+                client_session_keep_alive=True,
+                client_session_keep_alive_heartbeat_frequency=900,
             )
 
+    def _fetch_result(self, cur):
+        """
+        Fetches the rows of the current result set as a LazyResult.
+        Returns None if the result set is empty.
+        """
+        # Timestamps use microseconds so that dates beyond 2262 fit in every batch
+        batches = list(cur.fetch_arrow_batches(force_microsecond_precision=True))
+        if not batches:
+            return None
+        # The connector picks integer widths per batch, so the schemas are
+        # unified instead of required to match exactly.
+        table = pa.concat_tables(batches, promote_options="permissive")
+        if table.num_rows == 0:
+            return None
+        return LazyResult(table)
+
+    def _collect_result(self, cur, statement: str, results: list):
+        """
+        Appends the result of the statement last executed on the cursor to results.
+        """
+        statement_type = _first_keyword(statement)
+
+        message = _DML_MESSAGES.get(statement_type)
+        if message:
+            results.append(f"{message}: {cur.rowcount}")
+        elif cur.description:  # It's a query that returns rows
+            try:
+                df = self._fetch_result(cur)
+                if df is not None:
+                    results.append(df)
+                elif statement_type.startswith("SHOW"):
+                    results.append(
+                        "Show command executed successfully, but it did not produce any results to display."
+                    )
+            except snowflake.connector.errors.NotSupportedError:
+                # No need to download rows that are not displayed, they are
+                # discarded when the cursor is closed or moves to the next result.
+                pass
+        else:
+            results.append("Statement executed successfully.")
+
+    def _execute_multi_statement(self, statements: list):
+        """
+        Sends all statements to Snowflake in a single multi-statement request.
+        Returns the list of results, or None if the connector does not support
+        multi-statement execution or Snowflake splits the statements differently.
+        """
+        cur = self.conn.cursor()
+        try:
+            try:
+                # The separator goes on its own line so that a trailing -- comment
+                # cannot swallow it
+                cur.execute("\n;\n".join(statements), num_statements=len(statements))
+            except TypeError:
+                # Connector predates the num_statements argument
+                return None
+            except snowflake.connector.errors.ProgrammingError as e:
+                # Rejected before any statement runs, so they can be sent one by one
+                if e.errno == _STATEMENT_COUNT_MISMATCH_ERRNO:
+                    return None
+                raise
+
+            results = []
+            for statement in statements:
+                self._collect_result(cur, statement, results)
+                if not cur.nextset():
+                    break
+            return results
+        finally:
+            cur.close()
+
     def _snowflake_sql_executor(self, sql_query: str) -> list:
         """
         Executes a Snowflake SQL query and returns a list of results.
-        Each result can be a pandas DataFrame or a string message.
+        Each result can be a LazyResult, a pandas DataFrame or a string message.
         """
         self._create_connection()
 
-        # Split the SQL query into individual statements.
-        # This regex handles semicolons inside strings.
-        statements = re.split(r""";(?=(?:[^'"]|'[^']*'|"[^"]*")*$)""", sql_query)
-        statements = [s.strip() for s in statements if s.strip()]
+        # Split the SQL query into individual statements, dropping the ones that
+        # only contain comments.
+        statements = [
+            s.strip()
+            for s in _split_sql_statements(sql_query)
+            if _skip_comments(s) < len(s)
+        ]
+
+        # PUT/GET file transfers cannot be part of a multi-statement request
+        if len(statements) > 1 and not any(
+            _first_keyword(s) in _FILE_TRANSFER_STATEMENTS for s in statements
+        ):
+            results = self._execute_multi_statement(statements)
+            if results is not None:
+                return results
 
         results = []
         for statement in statements:
@@ -92,32 +402,7 @@ class SnowflakeSqlMagics(Magics):
             try:
                 cur = self.conn.cursor()
                 cur.execute(statement)
-
-                statement_type = statement.strip().split(maxsplit=1)[0].upper()
-
-                if statement_type in ("INSERT", "UPDATE", "DELETE", "MERGE"):
-                    message_map = {
-                        "INSERT": "Number of rows inserted",
-                        "UPDATE": "Number of rows updated",
-                        "DELETE": "Number of rows deleted",
-                        "MERGE": "Number of rows affected",
-                    }
-                    message = message_map.get(statement_type)
-                    results.append(f"{message}: {cur.rowcount}")
-                    cur.fetchall()  # Consume any potential result set
-                elif cur.description:  # It's a query that returns rows
-                    try:
-                        df = cur.fetch_pandas_all()
-                        if not df.empty:
-                            results.append(df)
-                        elif statement_type.startswith("SHOW"):
-                            results.append(
-                                "Show command executed successfully, but it did not produce any results to display."
-                            )
-                    except snowflake.connector.errors.NotSupportedError:
-                        cur.fetchall()  # Consume the result to avoid issues.
-                else:
-                    results.append("Statement executed successfully.")
+                self._collect_result(cur, statement, results)
             finally:
                 if cur:
                     cur.close()
@@ -127,16 +412,14 @@ class SnowflakeSqlMagics(Magics):
         """
         Parses arguments from the magic line.
         """
-        parser = ArgumentParser(description="Snowflake SQL cell magic")
-        parser.add_argument("--account", help="Snowflake account")
-        parser.add_argument("--user", help="Snowflake user")
-        parser.add_argument("--role", help="Snowflake role")
-        parser.add_argument("--private_key_path", help="Path to private key file")
-        parser.add_argument(
-            "--private_key_passphrase", help="Passphrase for private key"
-        )
+        args, _ = _SNOWAUTH_PARSER.parse_known_args(shlex.split(line))
+        return args
 
-        args, _ = parser.parse_known_args(shlex.split(line))
+    def _parse_snowsql_args(self, line: str) -> argparse.Namespace:
+        """
+        Parses arguments from the snowsql cell magic line.
+        """
+        args, _ = _SNOWSQL_PARSER.parse_known_args(shlex.split(line))
         return args
 
     def _initialize_connection(self, args):
@@ -150,6 +433,7 @@ class SnowflakeSqlMagics(Magics):
         self.private_key_passphrase = args.private_key_passphrase or os.getenv(
             "SNOWFLAKE_PRIVATE_KEY_PASSPHRASE"
         )
+        self._private_key = None
 
         if not all([self.account, self.user, self.role, self.private_key_path]):
             print(
@@ -178,7 +462,11 @@ class SnowflakeSqlMagics(Magics):
         Connection arguments can also be provided via environment variables:
         SNOWFLAKE_ACCOUNT, SNOWFLAKE_USER, SNOWFLAKE_ROLE, SNOWFLAKE_PRIVATE_KEY_PATH, SNOWFLAKE_PRIVATE_KEY_PASSPHRASE
         """
-        args = self._parse_args(line)
+        try:
+            args = self._parse_args(line)
+        except (argparse.ArgumentError, ValueError) as e:
+            print(f"Error: Invalid %snowauth arguments: {e}")
+            return
         self._initialize_connection(args)
 
     @cell_magic
@@ -186,12 +474,18 @@ class SnowflakeSqlMagics(Magics):
         """
         Cell magic to execute Snowflake SQL.
         Usage:
-        %%snowsql [variable_name]
+        %%snowsql [variable_name] [--limit-preview <rows>]
         <SQL QUERY>
 
         You must first establish a connection using the %snowauth magic.
         """
-        var_name = line.strip()
+        try:
+            args = self._parse_snowsql_args(line)
+        except (argparse.ArgumentError, ValueError) as e:
+            print(f"Error: Invalid %%snowsql arguments: {e}")
+            return
+        var_name = args.var_name
+        limit_preview = args.limit_preview
 
         if not self._initialized:
             print(
@@ -204,7 +498,7 @@ class SnowflakeSqlMagics(Magics):
             results = self._snowflake_sql_executor(processed_cell)
 
             dataframe_results = [
-                res for res in results if isinstance(res, pd.DataFrame)
+                res for res in results if isinstance(res, (pd.DataFrame, LazyResult))
             ]
 
             if var_name:
@@ -214,14 +508,19 @@ class SnowflakeSqlMagics(Magics):
                     )
 
                 if dataframe_results:
-                    self.shell.user_ns[var_name] = dataframe_results[-1]
+                    df = dataframe_results[-1]
+                    if isinstance(df, LazyResult):
+                        df = df.to_pandas()
+                    self.shell.user_ns[var_name] = df
                     print(f"Result stored in DataFrame '{var_name}'.")
                 else:
                     print(f"Warning: No DataFrame returned to assign to '{var_name}'.")
 
             if results:
                 for res in results:
-                    if isinstance(res, pd.DataFrame):
+                    if isinstance(res, (pd.DataFrame, LazyResult)):
+                        if limit_preview is not None:
+                            res = res.head(limit_preview)
                         display(res)
                     else:
                         print(res)
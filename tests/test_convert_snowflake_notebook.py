@@ -0,0 +1,81 @@
+# Copyright 2025 Snowflake Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from convert_snowflake_notebook import convert_notebook
+
+NOTEBOOK = {
+    "cells": [
+        {
+            "cell_type": "code",
+            "metadata": {"language": "sql"},
+            "source": ["SELECT 1\n", "FROM t;"],
+        }
+    ],
+    "metadata": {},
+    "nbformat": 4,
+}
+
+
+def _convert(tmp_path, input_filename):
+    output_filename = tmp_path / "out.ipynb"
+    convert_notebook(str(input_filename), str(output_filename))
+    with open(output_filename) as f:
+        return json.load(f)
+
+
+def test_sql_cells_get_snowsql_magic(tmp_path):
+    input_filename = tmp_path / "in.ipynb"
+    input_filename.write_text(json.dumps(NOTEBOOK))
+
+    cells = _convert(tmp_path, input_filename)["cells"]
+
+    assert cells[-1]["metadata"]["language"] == "python"
+    assert cells[-1]["source"] == ["%%snowsql\nSELECT 1\n", "FROM t;"]
+
+
+def test_input_that_cannot_be_memory_mapped(tmp_path):
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, json.dumps(NOTEBOOK).encode())
+    os.close(write_fd)
+    try:
+        cells = _convert(tmp_path, f"/dev/fd/{read_fd}")["cells"]
+    finally:
+        os.close(read_fd)
+
+    assert cells[-1]["source"] == ["%%snowsql\nSELECT 1\n", "FROM t;"]
+
+
+def test_empty_input_is_reported(tmp_path, capsys):
+    input_filename = tmp_path / "in.ipynb"
+    input_filename.write_bytes(b"")
+
+    convert_notebook(str(input_filename), str(tmp_path / "out.ipynb"))
+
+    assert "Could not decode JSON" in capsys.readouterr().out
+
+
+def test_integers_wider_than_64_bits_are_preserved(tmp_path):
+    notebook = dict(NOTEBOOK, metadata={"big": 123456789012345678901234567890})
+    input_filename = tmp_path / "in.ipynb"
+    input_filename.write_text(json.dumps(notebook))
+
+    metadata = _convert(tmp_path, input_filename)["metadata"]
+
+    assert metadata["big"] == 123456789012345678901234567890
@@ -0,0 +1,236 @@
+# Copyright 2025 Snowflake Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+
+import pyarrow as pa
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snowflake.connector.errors import ProgrammingError
+
+import snowflake_sql_magics
+from snowflake_sql_magics import SnowflakeSqlMagics, _split_sql_statements
+
+
+class FakeCursor:
+    """
+    Cursor that rejects a multi-statement request like Snowflake does when
+    num_statements differs from the number of statements the server counts.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rowcount = 0
+        self._remaining = 0
+
+    def execute(self, sql, num_statements=None):
+        if num_statements is not None:
+            if num_statements != self.conn.server_count:
+                raise ProgrammingError(
+                    msg="Actual statement count did not match the desired statement count",
+                    errno=snowflake_sql_magics._STATEMENT_COUNT_MISMATCH_ERRNO,
+                )
+            self._remaining = num_statements - 1
+        self.conn.executed.append((sql, num_statements))
+
+    def nextset(self):
+        if self._remaining:
+            self._remaining -= 1
+            return True
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, server_count=None):
+        # Number of statements Snowflake finds in a multi-statement request
+        self.server_count = server_count
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def is_closed(self):
+        return False
+
+
+class BatchCursor:
+    """
+    Cursor whose result set is returned as the given Arrow batches.
+    """
+
+    def __init__(self, batches):
+        self._batches = batches
+
+    def fetch_arrow_batches(self, force_microsecond_precision=False):
+        # Only the microsecond precision the magic asks for is supported
+        assert force_microsecond_precision
+        return iter(self._batches)
+
+
+def _magics(conn):
+    magics = SnowflakeSqlMagics(shell=None)
+    magics.conn = conn
+    return magics
+
+
+def test_trailing_line_comment_does_not_swallow_separator():
+    conn = FakeConnection(server_count=2)
+    sql = "CREATE TABLE t (x INT) -- trailing\n;\nDROP TABLE t -- trailing"
+
+    results = _magics(conn)._snowflake_sql_executor(sql)
+
+    assert results == ["Statement executed successfully."] * 2
+    assert conn.executed == [
+        ("CREATE TABLE t (x INT) -- trailing\n;\nDROP TABLE t -- trailing", 2)
+    ]
+
+
+def test_comment_only_segments_are_not_counted():
+    conn = FakeConnection(server_count=2)
+    sql = "CREATE TABLE t (x INT);\nDROP TABLE t;\n-- DROP TABLE u;\n/* SELECT 1; */\n"
+
+    results = _magics(conn)._snowflake_sql_executor(sql)
+
+    assert len(results) == 2
+    assert conn.executed == [("CREATE TABLE t (x INT)\n;\nDROP TABLE t", 2)]
+
+
+def test_statement_count_mismatch_falls_back_to_one_statement_at_a_time():
+    conn = FakeConnection(server_count=1)
+    sql = "CREATE TABLE t (x INT);\nDROP TABLE t"
+
+    results = _magics(conn)._snowflake_sql_executor(sql)
+
+    assert results == ["Statement executed successfully."] * 2
+    assert conn.executed == [
+        ("CREATE TABLE t (x INT)", None),
+        ("DROP TABLE t", None),
+    ]
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "df --limit-preview ten",
+        "df --limit-preview -5",
+        "df --limit-preview",
+        "df 'unbalanced",
+    ],
+)
+def test_invalid_snowsql_arguments_print_an_error(line, capsys):
+    magics = _magics(FakeConnection())
+    magics._initialized = True
+
+    magics.snowsql(line, "SELECT 1")
+
+    assert "Error: Invalid %%snowsql arguments" in capsys.readouterr().out
+    assert magics.conn.executed == []
+
+
+def test_snowsql_arguments_do_not_include_help():
+    args = SnowflakeSqlMagics(shell=None)._parse_snowsql_args("df -h")
+
+    assert args.var_name == "df"
+    assert args.limit_preview is None
+
+
+def test_result_batches_with_different_schemas_are_unified():
+    batches = [
+        pa.table(
+            {
+                "ID": pa.array([1], pa.int8()),
+                "TS": pa.array([0], pa.timestamp("us")),
+            }
+        ),
+        pa.table(
+            {
+                "ID": pa.array([300], pa.int64()),
+                "TS": pa.array([253402214400000000], pa.timestamp("us")),
+            }
+        ),
+    ]
+
+    result = _magics(FakeConnection())._fetch_result(BatchCursor(batches))
+
+    df = result.to_pandas()
+    assert df["ID"].tolist() == [1, 300]
+    assert df["TS"].iloc[1].year == 9999
+
+
+def test_empty_result_is_none():
+    assert _magics(FakeConnection())._fetch_result(BatchCursor([])) is None
+
+
+@pytest.mark.parametrize(
+    "sql, statements",
+    [
+        ("SELECT 1; SELECT 2", ["SELECT 1", " SELECT 2"]),
+        ("SELECT 'it''s; here'; SELECT 2", ["SELECT 'it''s; here'", " SELECT 2"]),
+        ("SELECT 'a\\'; b'; SELECT 2", ["SELECT 'a\\'; b'", " SELECT 2"]),
+        ('SELECT "a;b" FROM t; SELECT 2', ['SELECT "a;b" FROM t', " SELECT 2"]),
+        ("SELECT $$a;b$$; SELECT 2", ["SELECT $$a;b$$", " SELECT 2"]),
+        ("SELECT 1 -- a; b\n; SELECT 2", ["SELECT 1 -- a; b\n", " SELECT 2"]),
+        ("SELECT 1 /* a; b */; SELECT 2", ["SELECT 1 /* a; b */", " SELECT 2"]),
+        ("SELECT 'abc; SELECT 2", ["SELECT 'abc; SELECT 2"]),
+        ("SELECT 'abc\\", ["SELECT 'abc\\"]),
+        ('SELECT "a; b', ['SELECT "a; b']),
+        ("SELECT $$a; b", ["SELECT $$a; b"]),
+        ("SELECT 1 -- a; b", ["SELECT 1 -- a; b"]),
+        ("SELECT 1 /* a; b", ["SELECT 1 /* a; b"]),
+        (
+            "PUT file:///tmp/a.csv @stage; LIST @stage",
+            ["PUT file:///tmp/a.csv @stage", " LIST @stage"],
+        ),
+    ],
+)
+def test_split_sql_statements(sql, statements):
+    assert _split_sql_statements(sql) == statements
+
+
+def test_file_directive_without_dollar_quotes(tmp_path):
+    path = tmp_path / "payload.json"
+    path.write_text('{"a": "it\'s"}')
+
+    sql = _magics(FakeConnection())._process_file_directives(f"SELECT FILE('{path}')")
+
+    assert sql == """SELECT PARSE_JSON($${"a": "it's"}$$)"""
+
+
+def test_file_directive_containing_dollar_quotes(tmp_path):
+    path = tmp_path / "payload.json"
+    path.write_text(r"""{"a": "x$$y", "b": "it's", "c": "a\\b"}""")
+
+    sql = _magics(FakeConnection())._process_file_directives(f"SELECT FILE('{path}')")
+
+    assert sql == r"""SELECT PARSE_JSON('{"a": "x$$y", "b": "it\'s", "c": "a\\\\b"}')"""
+
+
+@pytest.mark.parametrize("line", ["--account", "--account 'unbalanced"])
+def test_invalid_snowauth_arguments_print_an_error(line, capsys):
+    SnowflakeSqlMagics(shell=None).snowauth(line)
+
+    assert "Error: Invalid %snowauth arguments" in capsys.readouterr().out
+
+
+def test_snowauth_arguments_do_not_include_help():
+    args = SnowflakeSqlMagics(shell=None)._parse_args("-h --account acme")
+
+    assert args.account == "acme"